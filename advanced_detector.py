@@ -6,70 +6,341 @@ Includes visualization and more detailed detection options
 """
 
 import librosa
+import numba
 import numpy as np
+import soundfile as sf
+import soxr
+from scipy.ndimage import uniform_filter1d
+from scipy.signal import find_peaks
 import json
 import os
 import argparse
+import hashlib
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# librosa's canonical analysis rate; beat tracking gains nothing from higher rates
+DEFAULT_SR = 22050
+# On-disk cache of decoded audio + detection results, keyed by file path and mtime
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "AIfunScript")
+# Decoded audio larger than this is not stored in the cache (envelope and beats still are)
+CACHE_MAX_AUDIO_BYTES = 100 * 1024 * 1024
+# Total cache size; least recently used entries are evicted beyond it
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# Arrays every cache entry must hold ("y" is optional)
+CACHE_REQUIRED_ARRAYS = ("sr", "onset_env", "onset_frames")
+# Part of every cache key; bump whenever detection results change, so stale entries are never served
+CACHE_VERSION = 2
+# Formats libsndfile decodes natively; these skip librosa.load's audioread fallback
+SOUNDFILE_EXTENSIONS = ('.wav', '.flac', '.ogg')
+# Actions formatted per write when exporting, and the output file's buffer size
+EXPORT_BATCH = 8192
+EXPORT_BUFFER_BYTES = 1 << 20
+# Files picked up when a directory is given on the command line
+BATCH_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a')
+
+
+@numba.njit(cache=True)
+def _build_actions_kernel(times_ms, strengths, max_strength):
+    """Interleave normalized main beats with pos=0 midpoints: beat, mid, beat, ..., beat"""
+    n = len(times_ms)
+    out_t = np.empty(max(2 * n - 1, 0), np.int64)
+    out_p = np.empty(max(2 * n - 1, 0), np.int32)
+    for i in range(n):
+        # Nonlinear normalization (sqrt) to enhance high-intensity beats
+        if max_strength > 0:
+            pos = int(30 + (100 - 30) * np.sqrt(strengths[i] / max_strength))
+        else:
+            pos = 100
+        out_t[2 * i] = times_ms[i]
+        out_p[2 * i] = min(100, max(30, pos))
+        # Insert a low point (pos=0) between each pair of main beats
+        if i + 1 < n:
+            out_t[2 * i + 1] = (times_ms[i] + times_ms[i + 1]) // 2
+            out_p[2 * i + 1] = 0
+    return out_t, out_p
+
+
+def _evict_cache(max_bytes=CACHE_MAX_BYTES):
+    """Delete the least recently used cache entries until the cache fits in max_bytes"""
+    entries = []
+    try:
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith('.npz'):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # Already evicted by a concurrent worker, or still open elsewhere
+            pass
+        total -= size
+
+
+def _fast_load(path, sr=DEFAULT_SR):
+    """Decode a file to mono float32, resampled to sr unless sr is None"""
+    if path.lower().endswith(SOUNDFILE_EXTENSIONS):
+        try:
+            y, native_sr = sf.read(path, dtype='float32', always_2d=False)
+        except RuntimeError as e:
+            print(f"soundfile could not read the file ({e}), falling back to librosa")
+        else:
+            if y.ndim > 1:
+                y = y.mean(axis=1, dtype=np.float32)
+            if sr is not None and sr != native_sr:
+                # soxr directly: librosa.resample would add a validation pass over the signal
+                y = soxr.resample(y, native_sr, sr, quality='HQ')
+                native_sr = sr
+            return y, native_sr
+    # Compressed formats (mp3, m4a) need librosa's audioread/ffmpeg fallback.
+    # soxr_hq is the fast resampler bundled with librosa>=0.10 (kaiser_* needs resampy)
+    return librosa.load(path, sr=sr, mono=True, dtype=np.float32, res_type='soxr_hq')
+
 
 class AdvancedDrumBeatDetector:
-    def __init__(self, audio_path: str):
+    # Shared STFT frame grid for every spectral call in the detector
+    n_fft = 2048
+    hop_length = 512
+
+    def __init__(self, audio_path: str, use_cache: bool = True):
+        self.use_cache = use_cache
+        self.set_audio(audio_path)
+
+    def set_audio(self, audio_path: str):
+        """Point the detector at another file, dropping all per-file state"""
         self.audio_path = audio_path
+        self._cache_sr = None
+        # Whether _save_cache stores the decoded signal; off for signals that can't come back
+        # from the cache anyway (e.g. video audio piped from ffmpeg)
+        self._cache_audio = True
         self.y = None
         self.sr = None
         self.onset_frames = None
         self.onset_times = None
+        self.onset_env = None
+        # Funscript actions kept as parallel arrays; dicts are only built at dump time
+        self._at = np.empty(0, np.int32)
+        self._pos = np.empty(0, np.int32)
+
+    @classmethod
+    def warmup(cls, sr=DEFAULT_SR):
+        """Run detection once on a second of silence, so numba compilation and librosa's
+        lazy imports are paid before the first real file"""
+        detector = cls("", use_cache=False)
+        detector.y = np.zeros(sr, dtype=np.float32)
+        detector.sr = sr
+        detector.detect_beats_librosa()
+        detector._build_actions()
+
+    def _cache_path(self):
+        stat = os.stat(self.audio_path)
+        key_src = (f"v{CACHE_VERSION}|{os.path.abspath(self.audio_path)}|{stat.st_mtime_ns}|"
+                   f"{self._cache_sr}|{self.n_fft}|{self.hop_length}")
+        key = hashlib.sha1(key_src.encode('utf-8')).hexdigest()
+        return os.path.join(CACHE_DIR, f"{key}.npz")
+
+    def _load_cache(self, include_audio=True):
+        """Return cached arrays for the current file, or None on a miss
+
+        With include_audio=False the stored signal ("y") is not read from disk.
+        """
+        if not self.use_cache:
+            return None
+        try:
+            cache_path = self._cache_path()
+            if not os.path.exists(cache_path):
+                return None
+        except OSError as e:
+            print(f"Warning: cannot check the cache: {e}")
+            return None
+        try:
+            with np.load(cache_path) as data:
+                arrays = {name: data[name] for name in data.files if include_audio or name != "y"}
+            for name in CACHE_REQUIRED_ARRAYS:
+                if name not in arrays:
+                    raise KeyError(f"missing array '{name}'")
+            # A hit counts as a use: eviction goes by mtime
+            os.utime(cache_path)
+            return arrays
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile) as e:
+            # Drop the entry so this run's results replace it instead of failing on it again
+            print(f"Warning: discarding unreadable cache entry: {e}")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+            return None
 
-    def load_audio(self, sr=None):
+    def _save_cache(self):
+        if not self.use_cache:
+            return
+        arrays = {
+            "sr": np.asarray(self.sr),
+            "onset_env": self.onset_env,
+            "onset_frames": self.onset_frames,
+        }
+        if self._cache_audio and self.y.nbytes <= CACHE_MAX_AUDIO_BYTES:
+            arrays["y"] = self.y
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            cache_path = self._cache_path()
+            # A temp file of its own per writer: concurrent runs on the same input (GUI worker,
+            # CLI batches) must never interleave into one archive before the atomic replace
+            fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+            try:
+                # Uncompressed: float audio barely compresses and zlib would dominate load time
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, cache_path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print(f"Warning: could not write cache: {e}")
+            return
+        _evict_cache()
+
+    def load_audio(self, sr=DEFAULT_SR):
         print(f"Loading audio file: {self.audio_path}")
-        self.y, self.sr = librosa.load(self.audio_path, sr=sr)
+        self._cache_sr = sr
+        self._cache_audio = True
+        cache = self._load_cache()
+        if cache is not None and "y" in cache:
+            self.y, self.sr = cache["y"], int(cache["sr"])
+            print("Audio restored from cache")
+        else:
+            self.y, self.sr = _fast_load(self.audio_path, sr)
+        if cache is not None:
+            self.onset_env = cache["onset_env"]
+            self.onset_frames = cache["onset_frames"]
+        print(f"Audio loaded - Sample rate: {self.sr}Hz, Duration: {len(self.y)/self.sr:.2f}s")
+
+    def load_from_array(self, y, sr, cache_audio=False):
+        """Use an already decoded mono signal (e.g. piped from ffmpeg) instead of reading audio_path
+
+        audio_path still keys the cache, so a cached envelope and beats for the source are reused.
+        The signal itself is cached only with cache_audio, i.e. when it was decoded from audio_path
+        and load_audio could restore it later.
+        """
+        self._cache_sr = sr
+        self._cache_audio = cache_audio
+        self.y = np.ascontiguousarray(y, dtype=np.float32)
+        self.sr = sr
+        # The signal is already here; read only the envelope and beats
+        cache = self._load_cache(include_audio=False)
+        if cache is not None:
+            self.onset_env = cache["onset_env"]
+            self.onset_frames = cache["onset_frames"]
         print(f"Audio loaded - Sample rate: {self.sr}Hz, Duration: {len(self.y)/self.sr:.2f}s")
 
     def detect_beats_librosa(self):
         print("Detecting main musical beats (using librosa.beat.beat_track)...")
         if self.y is None or self.sr is None:
             self.load_audio()
-        tempo, beat_frames = librosa.beat.beat_track(y=self.y, sr=self.sr)
-        self.onset_frames = beat_frames
-        self.onset_times = librosa.frames_to_time(beat_frames, sr=self.sr)
+        if self.onset_env is not None and self.onset_frames is not None:
+            print("Using cached onset envelope and beats")
+        else:
+            # The mel dB spectrogram is computed once and feeds both envelopes: beat_track's own
+            # median-aggregated one, and the mean-aggregated one whose strengths scale the export.
+            # Pinned to float32 (the float32 signal already yields it) so the envelope, the
+            # cache and the export kernel never fall back to float64 copies
+            S = librosa.power_to_db(librosa.feature.melspectrogram(y=self.y, sr=self.sr, n_fft=self.n_fft,
+                                                                   hop_length=self.hop_length))
+            beat_env = librosa.onset.onset_strength(S=S, sr=self.sr, hop_length=self.hop_length,
+                                                    aggregate=np.median)
+            self.onset_env = librosa.onset.onset_strength(S=S, sr=self.sr,
+                                                          hop_length=self.hop_length).astype(np.float32, copy=False)
+            tempo, beat_frames = librosa.beat.beat_track(onset_envelope=beat_env, sr=self.sr,
+                                                         hop_length=self.hop_length)
+            self.onset_frames = beat_frames
+            self._save_cache()
+        # Same arithmetic as librosa.frames_to_time (integer sample index, then / sr), so the
+        # millisecond timestamps match it exactly; a precomputed hop/sr factor rounds differently
+        self.onset_times = self.onset_frames * self.hop_length / self.sr
         print(f"Detected {len(self.onset_times)} main beats")
 
+    def detect_beats_fast(self, threshold=12.0):
+        """Detect hits from the time-domain amplitude envelope (no STFT), for percussive content
+
+        threshold is the minimum prominence of a hit, in robust standard deviations (scaled MAD)
+        of the envelope's rise above its median.
+        """
+        print("Detecting beats from the amplitude envelope (fast mode)...")
+        if self.y is None or self.sr is None:
+            self.load_audio()
+        # O(n) box-filtered RMS envelope; its rising edges mark the hits
+        env = np.sqrt(np.maximum(uniform_filter1d(self.y * self.y, size=self.hop_length), 0))
+        # Rise across one hop, centred on each sample, so a peak sits on the attack itself
+        half = self.hop_length // 2
+        rise = np.zeros_like(env)
+        rise[half:-half] = env[2 * half:] - env[:-2 * half]
+        # Noise floor from the median and MAD of |rise|: unlike the standard deviation, neither
+        # is pulled up by the hits, so ordinary envelope ripple stays below it
+        magnitude = np.abs(rise)
+        median = np.median(magnitude)
+        mad = np.median(np.abs(magnitude - median))
+        floor = max(median + threshold * 1.4826 * mad, 1e-3 * magnitude.max())
+        peaks, _ = find_peaks(rise, distance=max(1, int(0.1 * self.sr)), prominence=floor)
+        # Per-frame maximum rise stands in for the onset envelope when scaling positions on export
+        positive_rise = np.maximum(rise, 0)
+        n_frames = -(-len(positive_rise) // self.hop_length)
+        frame_rise = np.zeros(n_frames * self.hop_length, dtype=np.float32)
+        frame_rise[:len(positive_rise)] = positive_rise
+        self.onset_env = frame_rise.reshape(n_frames, self.hop_length).max(axis=1)
+        self.onset_frames = peaks // self.hop_length
+        self.onset_times = peaks / self.sr
+        print(f"Detected {len(self.onset_times)} hits")
+
+    def _build_actions(self):
+        """Fill self._at / self._pos with the sorted, deduplicated funscript actions"""
+        onset_env = self.onset_env if self.onset_env is not None else \
+            librosa.onset.onset_strength(y=self.y, sr=self.sr, n_fft=self.n_fft,
+                                         hop_length=self.hop_length).astype(np.float32, copy=False)
+        times = self.onset_times
+        indices = self.onset_frames
+        # Beat frames are sorted, so out-of-range frames form a suffix: slice, don't mask
+        cut = np.searchsorted(indices, len(onset_env))
+        indices = indices[:cut]
+        times = times[:cut]
+        t_ms = (times * 1000).astype(np.int64)
+        onset_strengths = onset_env[indices]
+        max_strength = float(onset_strengths.max()) if len(onset_strengths) > 0 else 1.0
+        all_t, all_p = _build_actions_kernel(t_ms, onset_strengths, max_strength)
+        # Sort actions by time and remove duplicates in one pass. np.unique reports the
+        # first occurrence of each timestamp, and each main beat precedes the midpoints
+        # that could collide with it, so a main beat always wins over a midpoint.
+        uniq_t, first_idx = np.unique(all_t, return_index=True)
+        self._at = uniq_t.astype(np.int32)
+        self._pos = all_p[first_idx]
+
     def export_funscript(self, output_path: str = "output.funscript"):
         if self.onset_frames is None or self.onset_times is None:
             print("No beats detected, cannot export funscript. Please run detection first.")
             return
-        onset_env = librosa.onset.onset_strength(y=self.y, sr=self.sr)
-        times = self.onset_times
-        indices = self.onset_frames
-        valid_mask = indices < len(onset_env)
-        indices = indices[valid_mask]
-        times = times[valid_mask]
-        actions = []
-        t_ms_list = [int(t * 1000) for t in times]
-        onset_strengths = onset_env[indices] if len(indices) > 0 else np.array([])
-        max_strength = onset_strengths.max() if len(onset_strengths) > 0 else 1
-        main_points = []
-        for t_ms, strength in zip(t_ms_list, onset_strengths):
-            # Nonlinear normalization (sqrt) to enhance high-intensity beats
-            norm_strength = int(30 + (100 - 30) * ((strength / max_strength) ** 0.5)) if max_strength > 0 else 100
-            norm_strength = min(100, max(30, norm_strength))
-            actions.append({"at": t_ms, "pos": norm_strength})
-            main_points.append((t_ms, norm_strength))
-        # Insert a low point (pos=0) between each pair of main beats
-        for i in range(len(main_points) - 1):
-            t1, s1 = main_points[i]
-            t2, s2 = main_points[i+1]
-            mid = (t1 + t2) // 2
-            actions.append({"at": mid, "pos": 0})
-        # Sort actions by time and remove duplicates (keep first occurrence)
-        actions = sorted(actions, key=lambda x: x["at"])
-        deduped = []
-        seen = set()
-        for act in actions:
-            if act["at"] not in seen:
-                deduped.append(act)
-                seen.add(act["at"])
+        with open(output_path, 'wb', buffering=EXPORT_BUFFER_BYTES) as f:
+            self.export_funscript_stream(f)
+        print(f"Funscript exported: {output_path}")
+        print(f"Total actions: {len(self._at)}")
+
+    def export_funscript_stream(self, fh):
+        """Write the funscript as compact JSON to a binary file object, actions in bounded batches"""
+        self._build_actions()
+        # Everything except "actions"; the actions array is streamed separately below
         funscript = {
-            "actions": deduped,
             "inverted": False,
             "metadata": {
                 "creator": "AIfunScript",
@@ -87,25 +358,88 @@ class AdvancedDrumBeatDetector:
             "range": 100,
             "version": "1.0"
         }
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(funscript, f, indent=2)
-        print(f"Funscript exported: {output_path}")
-        print(f"Total actions: {len(deduped)}")
+        # Hand-written compact JSON for the actions ({"at":<10 digits>,"pos":<3 digits>} fits
+        # in 32 bytes), filled into one reusable buffer that is written out per batch
+        buf = bytearray(EXPORT_BATCH * 32)
+        view = memoryview(buf)
+        fh.write(b'{"actions":[')
+        sep = b''
+        for start in range(0, len(self._at), EXPORT_BATCH):
+            stop = start + EXPORT_BATCH
+            offset = 0
+            for at, pos in zip(self._at[start:stop].tolist(), self._pos[start:stop].tolist()):
+                chunk = b'%s{"at":%d,"pos":%d}' % (sep, at, pos)
+                sep = b','
+                buf[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+            fh.write(view[:offset])
+        # Remaining keys via json, minus the opening brace already emitted
+        fh.write(b'],' + json.dumps(funscript, separators=(',', ':'))[1:].encode('utf-8'))
+
+
+def _process_one(audio_file, output_path, sr=DEFAULT_SR, use_cache=True, fast=False):
+    """Run the full pipeline on one file (top-level so worker processes can pickle it)"""
+    detector = AdvancedDrumBeatDetector(audio_file, use_cache=use_cache)
+    detector.load_audio(sr=sr)
+    if fast:
+        detector.detect_beats_fast()
+    else:
+        detector.detect_beats_librosa()
+    detector.export_funscript(output_path)
+    return output_path
+
+
+def _positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got '{value}'")
+    return number
 
 
 def main():
     parser = argparse.ArgumentParser(description='Advanced music beat detection tool')
-    parser.add_argument('audio_file', help='Path to audio file')
-    parser.add_argument('--funscript', help='Output funscript file path', default='output.funscript')
+    parser.add_argument('audio_file', help='Path to audio file, or a directory to process every audio file in it')
+    parser.add_argument('--funscript', help='Output funscript file path (ignored for directories, '
+                        'where each funscript is written next to its audio file)', default='output.funscript')
+    parser.add_argument('--native-sr', action='store_true',
+                        help=f'Analyze at the file\'s native sample rate instead of {DEFAULT_SR}Hz')
+    parser.add_argument('--no-cache', action='store_true', help=f'Do not read or write the analysis cache in {CACHE_DIR}')
+    parser.add_argument('--fast', action='store_true',
+                        help='Fast mode for drum-heavy tracks: amplitude-envelope peaks instead of spectral beat tracking')
+    parser.add_argument('--jobs', type=_positive_int, default=None,
+                        help='Parallel worker processes for directory input (default: CPU count)')
     args = parser.parse_args()
     if not os.path.exists(args.audio_file):
         print(f"Error: Audio file '{args.audio_file}' does not exist")
         return
-    detector = AdvancedDrumBeatDetector(args.audio_file)
+    sr = None if args.native_sr else DEFAULT_SR
+    use_cache = not args.no_cache
+    if os.path.isdir(args.audio_file):
+        files = sorted(os.path.join(args.audio_file, name) for name in os.listdir(args.audio_file)
+                       if name.lower().endswith(BATCH_EXTENSIONS))
+        if not files:
+            print(f"Error: No audio files found in '{args.audio_file}'")
+            return
+        print(f"Processing {len(files)} files with {args.jobs or os.cpu_count()} workers")
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = {
+                executor.submit(_process_one, path, os.path.splitext(path)[0] + '.funscript', sr, use_cache,
+                                args.fast): path
+                for path in files
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error processing '{futures[future]}': {e}")
+        print("\nFunscript export completed!")
+        return
     try:
-        detector.load_audio()
-        detector.detect_beats_librosa()
-        detector.export_funscript(args.funscript)
+        _process_one(args.audio_file, args.funscript, sr, use_cache, args.fast)
         print("\nFunscript export completed!")
     except Exception as e:
         print(f"Error during processing: {e}")
@@ -8,111 +8,386 @@ Provides a graphical interface to select audio files, set parameters, and genera
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import threading
-import tempfile
+import queue
+import multiprocessing
 import subprocess
 import sys
+import shutil
+import re
+import importlib
+import importlib.util
+import importlib.metadata
+import io
+import threading
+import pathlib
+from collections import deque, OrderedDict
 
 # Global variable
-MOVIEPY_AVAILABLE = False
+FFMPEG_PATH = None
+# Audio decoded from videos is delivered at the detector's analysis rate, mono
+EXTRACT_SR = 22050
+# Read size for ffmpeg's raw-sample pipe
+PIPE_CHUNK_BYTES = 1 << 20
+# Interval (ms) at which queued log/progress updates are applied to the widgets
+UI_POLL_MS = 50
+# Delay (ms) after startup before the detection worker is spawned and warmed up
+WARMUP_DELAY_MS = 100
+# Decoded signals the detection worker keeps in memory: the current and the previous input
+DECODED_SIGNALS_MAX = 2
+# Oldest lines are dropped from the log widget beyond this many
+LOG_MAX_LINES = 500
+# Input types, by extension; also used to pick the file type for a file chosen under "All Files"
+AUDIO_EXTENSIONS = frozenset({'.mp3', '.wav', '.flac', '.m4a', '.ogg'})
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.avi', '.mkv', '.mov', '.wmv', '.flv'})
+# Version requirements checked at startup (same pins as requirements.txt)
+REQUIRED = {"librosa": ">=0.10.0", "numpy": ">=1.25.0", "matplotlib": ">=3.5.0"}
+# {name: available} from the startup probe; reused by the GUI instead of probing again
+_DEP_STATUS = {}
+
+def is_installed(module_name):
+    """Check whether a module is importable without executing it"""
+    return importlib.util.find_spec(module_name) is not None
+
+def is_satisfied(module_name):
+    """Check that a module is installed at a version meeting REQUIRED, without importing it"""
+    if not is_installed(module_name):
+        return False
+    try:
+        version = importlib.metadata.version(module_name)
+        from packaging.specifiers import SpecifierSet
+    except (importlib.metadata.PackageNotFoundError, ImportError):
+        # Not pip-managed, or no way to compare versions: being importable has to do
+        return True
+    return SpecifierSet(REQUIRED[module_name]).contains(version, prereleases=True)
+
+def find_ffmpeg():
+    """Locate ffmpeg on PATH, falling back to the binary bundled with imageio-ffmpeg"""
+    path = shutil.which("ffmpeg")
+    if path:
+        return path
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return None
+
+def find_ffprobe(ffmpeg_path):
+    """Locate ffprobe on PATH or next to ffmpeg (imageio-ffmpeg does not bundle one)"""
+    path = shutil.which("ffprobe")
+    if path or not ffmpeg_path:
+        return path
+    directory, name = os.path.split(ffmpeg_path)
+    candidate = os.path.join(directory, name.replace("ffmpeg", "ffprobe"))
+    return candidate if os.path.isfile(candidate) else None
+
+def probe_audio_stream(path, ffmpeg_path):
+    """Return the first audio stream's "codec_name" and the container "duration"; without an
+    audio stream only "duration" is present. None if it can't be probed"""
+    ffprobe = find_ffprobe(ffmpeg_path)
+    if not ffprobe:
+        return None
+    try:
+        output = subprocess.check_output(
+            [ffprobe, "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=codec_name:format=duration",
+             "-of", "default=noprint_wrappers=1", path],
+            stdin=subprocess.DEVNULL, stderr=subprocess.DEVNULL, universal_newlines=True,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return dict(line.split("=", 1) for line in output.splitlines() if "=" in line)
+
+def parse_ffmpeg_time(text):
+    """Convert an ffmpeg HH:MM:SS.xx timestamp to seconds"""
+    hours, minutes, seconds = text.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
 
 # Dependency check function
-def check_and_install_dependencies():
-    """Check and install missing dependencies"""
-    global MOVIEPY_AVAILABLE
-    missing_deps = []
+def check_dependencies():
+    """Probe dependencies without importing or installing anything, returning {name: available}"""
+    global FFMPEG_PATH
     
-    # Check librosa
-    try:
-        import librosa
-    except ImportError:
-        missing_deps.append("librosa")
+    # Probe with find_spec/metadata only: importing librosa here would load numba/scipy
+    # before the window is even shown
+    for module_name in REQUIRED:
+        _DEP_STATUS[module_name] = is_satisfied(module_name)
     
-    # Check numpy
-    try:
-        import numpy
-    except ImportError:
-        missing_deps.append("numpy")
+    # Check ffmpeg
+    FFMPEG_PATH = find_ffmpeg()
+    _DEP_STATUS["ffmpeg"] = FFMPEG_PATH is not None
+    return _DEP_STATUS
+
+def missing_requirements():
+    """Requirement specs for everything the last probe found missing"""
+    # Satisfied packages are left out, so pip never upgrades a working librosa/numba pair
+    missing = [f"{module_name}{spec}" for module_name, spec in REQUIRED.items()
+               if not _DEP_STATUS.get(module_name)]
+    if not _DEP_STATUS.get("ffmpeg"):
+        missing.append("imageio-ffmpeg")
+    return missing
+
+def _install_missing(missing):
+    """Start a single pip run installing the given specs; its output is read from proc.stdout"""
+    # No self-update HTTP check and no .pyc writes into a possibly read-only site-packages
+    env = {**os.environ, "PIP_DISABLE_PIP_VERSION_CHECK": "1", "PYTHONDONTWRITEBYTECODE": "1"}
+    # pip's output goes through a pipe: a windowed build has no console to write to,
+    # and writes to a missing console handle can stall pip for seconds
+    return subprocess.Popen([sys.executable, "-m", "pip", "install", "--disable-pip-version-check",
+                             "--no-input", "--prefer-binary", *missing],
+                            env=env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, bufsize=1, errors="replace",
+                            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+
+def _follow_ffmpeg_progress(stderr, progress, last_lines):
+    """Turn ffmpeg's stderr into progress updates, keeping the last lines for error reports"""
+    # ffmpeg reports "Duration:" once, then "time=" progress lines on stderr
+    duration = None
+    for line in io.TextIOWrapper(stderr, errors="replace"):
+        last_lines.append(line.strip())
+        if duration is None:
+            match = re.search(r"Duration:\s*(\d+:\d+:\d+(?:\.\d+)?)", line)
+            if match:
+                duration = parse_ffmpeg_time(match.group(1))
+        match = re.search(r"time=\s*(\d+:\d+:\d+(?:\.\d+)?)", line)
+        if match and duration:
+            fraction = min(1.0, parse_ffmpeg_time(match.group(1)) / duration)
+            progress(15 + 15 * fraction, "Extracting audio from video...")
+
+def decode_video_audio(video_path, ffmpeg_path, log, progress):
+    """Decode a video's audio track to a mono float32 array at EXTRACT_SR
+    
+    ffmpeg writes raw samples to a pipe that is read straight into a numpy buffer,
+    so no intermediate WAV is encoded, written and decoded again.
+    """
+    import numpy as np
     
-    # Check matplotlib
+    # Check if ffmpeg is available
+    if not ffmpeg_path:
+        raise Exception("ffmpeg not found. Please install ffmpeg or run: pip install imageio-ffmpeg")
+    
+    stream = probe_audio_stream(video_path, ffmpeg_path)
+    if stream is not None and "codec_name" not in stream:
+        raise Exception("Video file has no audio track")
+    # Size the buffer from the probed duration (plus slack); it is grown if that falls short
     try:
-        import matplotlib
-    except ImportError:
-        missing_deps.append("matplotlib")
+        duration = float(stream["duration"])
+    except (TypeError, KeyError, ValueError):
+        duration = 600.0
+    samples = np.empty(int(duration * EXTRACT_SR * 1.01) + EXTRACT_SR, dtype=np.float32)
+    
+    log("Extracting audio from video...")
+    progress(15, "Extracting audio from video...")
+    
+    # Decode only the audio stream, downmixed and resampled for beat detection
+    cmd = [ffmpeg_path, "-i", video_path, "-vn", "-ac", "1", "-ar", str(EXTRACT_SR),
+           "-f", "f32le", "-"]
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, bufsize=PIPE_CHUNK_BYTES,
+                            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+    # stderr is drained on its own thread so neither pipe can fill up and stall ffmpeg
+    last_lines = deque(maxlen=5)
+    stderr_thread = threading.Thread(target=_follow_ffmpeg_progress,
+                                     args=(proc.stderr, progress, last_lines), daemon=True)
+    stderr_thread.start()
     
-    # Check moviepy
     try:
-        from moviepy import VideoFileClip
-        MOVIEPY_AVAILABLE = True
-    except ImportError:
-        missing_deps.append("moviepy")
-        MOVIEPY_AVAILABLE = False
+        raw = memoryview(samples).cast("B")
+        filled = 0
+        while True:
+            if filled == len(raw):
+                grown = np.empty(2 * len(samples), dtype=np.float32)
+                grown[:len(samples)] = samples
+                samples = grown
+                raw = memoryview(samples).cast("B")
+            n = proc.stdout.readinto(raw[filled:filled + PIPE_CHUNK_BYTES])
+            if not n:
+                break
+            filled += n
+    finally:
+        proc.stdout.close()
+        returncode = proc.wait()
+        stderr_thread.join()
     
-    # If there are missing dependencies, try to install them
-    if missing_deps:
-        print(f"Missing dependencies: {missing_deps}")
-        print("Attempting to install missing dependencies...")
-        
-        try:
-            for dep in missing_deps:
-                print(f"Installing {dep}...")
-                subprocess.check_call([sys.executable, "-m", "pip", "install", dep])
-                print(f"{dep} installed successfully")
-            
-            # Recheck moviepy
-            try:
-                from moviepy import VideoFileClip
-                MOVIEPY_AVAILABLE = True
-                print("MoviePy available after installation")
-            except ImportError:
-                MOVIEPY_AVAILABLE = False
-                print("MoviePy still not available")
-                
-        except subprocess.CalledProcessError as e:
-            print(f"Failed to install dependencies: {e}")
-            return False
+    if returncode != 0:
+        detail = next((l for l in reversed(last_lines) if l), "unknown error")
+        raise Exception(f"Audio extraction failed: ffmpeg failed: {detail}")
+    
+    log("Audio extraction completed successfully")
+    n_samples = filled // 4
+    # A view would keep the whole buffer alive (and cached), so copy out when the size
+    # estimate overshot, e.g. without ffprobe the buffer starts from a 600 s guess and doubles
+    if len(samples) > n_samples + n_samples // 20 + 2 * EXTRACT_SR:
+        return samples[:n_samples].copy()
+    return samples[:n_samples]
+
+# (path, mtime_ns, size, file_type) -> read-only mono signal at EXTRACT_SR, oldest first
+_decoded_signals = OrderedDict()
+
+def _reporters(events):
+    """Return log(message) and progress(value, status_text) callbacks posting to events"""
+    def log(message):
+        events.put(("log", message))
+    
+    def progress(value, status_text=""):
+        events.put(("progress", value, status_text))
+    
+    return log, progress
+
+def _load_signal(detector, key, ffmpeg_path, log, progress):
+    """Load the input identified by key into the detector, reusing the signal from a recent run
+    
+    Signals are memoized in _decoded_signals by (path, mtime_ns, size, file_type), so an
+    edited file is decoded again; the reporters are only used when decoding.
+    """
+    input_file, mtime_ns, size, file_type = key
+    # Audio files' signals come from load_audio and can be restored from the cache; piped video audio can't
+    cache_audio = file_type != "video"
+    y = _decoded_signals.get(key)
+    if y is not None:
+        _decoded_signals.move_to_end(key)
+        log("Reusing audio decoded in a previous run")
+        detector.load_from_array(y, EXTRACT_SR, cache_audio=cache_audio)
+        return
+    if file_type == "video":
+        # Straight into memory, no intermediate file
+        y = decode_video_audio(input_file, ffmpeg_path, log, progress)
+        detector.load_from_array(y, EXTRACT_SR, cache_audio=cache_audio)
+    else:
+        # One cache read restores the signal together with its envelope and beats
+        detector.load_audio(sr=EXTRACT_SR)
+        y = detector.y
+    # Shared between runs, so nothing downstream may modify it in place
+    y.flags.writeable = False
+    _decoded_signals[key] = y
+    while len(_decoded_signals) > DECODED_SIGNALS_MAX:
+        _decoded_signals.popitem(last=False)
+
+def _worker_main(jobs, events):
+    """Serve detection jobs from the jobs queue in a long-lived child process until None arrives
+    
+    librosa/numba stay imported and one warmed-up detector is reused across runs, so only
+    the first job after startup pays for imports and JIT compilation.
+    """
+    try:
+        # Imported in the child, so librosa/numba never load in the GUI process
+        from advanced_detector import AdvancedDrumBeatDetector
+        AdvancedDrumBeatDetector.warmup()
+    except Exception as e:
+        startup_error = e
+    else:
+        startup_error = None
     
-    return True
+    detector = None
+    # (path, mtime_ns, size, file_type) of the input the detector currently holds results for
+    detector_key = None
+    for job in iter(jobs.get, None):
+        if startup_error is not None:
+            events.put(("done", False, f"Error during processing: {str(startup_error)}"))
+            continue
+        if detector is None:
+            detector = AdvancedDrumBeatDetector(job[0])
+        detector_key = _run_job(detector, detector_key, *job, events)
 
-# Check dependencies at startup
-if not check_and_install_dependencies():
-    print("Warning: Some dependencies could not be installed automatically")
-    print("Please install manually: pip install -r requirements.txt")
+def _run_job(detector, detector_key, input_file, output_file, file_type, ffmpeg_path, events):
+    """Run the detection pipeline for one file, reporting back through the events queue
+    
+    Events are ("log", message), ("progress", value, status_text) and a final
+    ("done", success, message). Returns the key of the input the detector now holds
+    results for (None after a failure), to be passed back in as detector_key.
+    """
+    log, progress = _reporters(events)
+    
+    try:
+        st = os.stat(input_file)
+        key = (os.path.abspath(input_file), st.st_mtime_ns, st.st_size, file_type)
+        if key == detector_key:
+            # Same unchanged input as the last run: its signal and beats are still loaded
+            log("Input unchanged since the last run, reusing its detected beats")
+            progress(70, "Beat detection completed")
+        else:
+            _load_and_detect(detector, key, ffmpeg_path, events)
+        
+        # Export funscript
+        log("Exporting funscript...")
+        progress(80, "Exporting funscript...")
+        detector.export_funscript(output_file)
+        log("Funscript export completed")
+        progress(90, "Funscript export completed")
+        
+        log("Processing completed!")
+        progress(100, "Processing completed!")
+        events.put(("done", True, "Funscript file generated successfully!"))
+        return key
+        
+    except Exception as e:
+        events.put(("done", False, f"Error during processing: {str(e)}"))
+        return None
 
-# Import detector (after dependency check)
-try:
-    from advanced_detector import AdvancedDrumBeatDetector
-except ImportError as e:
-    print(f"Error importing advanced_detector: {e}")
-    AdvancedDrumBeatDetector = None
+def _load_and_detect(detector, key, ffmpeg_path, events):
+    """Bind the detector to the input identified by key, load its audio and detect beats"""
+    log, progress = _reporters(events)
+    input_file, _, _, file_type = key
+    
+    # Rebind the shared detector to this run's input
+    detector.set_audio(input_file)
+    
+    if file_type == "video":
+        log("Video file detected, extracting audio...")
+        progress(5, "Starting video processing...")
+    else:
+        log("Loading audio file...")
+        progress(10, "Loading audio file...")
+    _load_signal(detector, key, ffmpeg_path, log, progress)
+    if file_type == "video":
+        progress(30, "Audio extraction completed")
+    log("Audio loading completed")
+    progress(40, "Audio loading completed")
+    
+    # Detect beats
+    log("Detecting beats...")
+    progress(50, "Detecting beats...")
+    detector.detect_beats_librosa()
+    log("Beat detection completed")
+    progress(70, "Beat detection completed")
 
 class DrumBeatDetectorGUI:
-    def __init__(self, root):
+    def __init__(self, root, deps_status):
         self.root = root
         self.root.title("Music Beat Detection Tool")
         self.root.geometry("700x600")
-        # 修复：初始化temp_audio_file属性，防止后续报错
-        self.temp_audio_file = None
+        self.deps_status = deps_status
         
-        # Check if detector is available
-        if AdvancedDrumBeatDetector is None:
-            messagebox.showerror("Error", "Advanced detector not available. Please check dependencies.")
-            root.destroy()
-            return
+        # State variable
+        self.processing = False
+        self._worker = None
+        self._jobs = None
+        self._events = None
+        self._installer = None
+        self._installer_output = None
+        # Whether the detector's dependencies are present (the detector itself is imported by the worker)
+        self._detector_ready = False
         
         # Variables
         self.input_file = tk.StringVar()
         self.output_file = tk.StringVar()
         self.file_type = tk.StringVar(value="audio")  # "audio" or "video"
         
-        # State variable
-        self.processing = False
+        # Log/progress updates, applied to the widgets once per UI_POLL_MS tick
+        self._log_q = queue.Queue()
+        # Only the latest progress matters, so updates overwrite each other between ticks
+        self._pending_progress = None
+        self._pending_status = None
         
-        # Check moviepy status
-        if not MOVIEPY_AVAILABLE:
-            print("Warning: MoviePy not available. Video processing will not work.")
+        # Check ffmpeg status
+        if not FFMPEG_PATH:
+            print("Warning: ffmpeg not available. Video processing will not work.")
         
         self.create_widgets()
+        self.root.after(UI_POLL_MS, self._drain_ui)
+        self._refresh_dependency_status()
+        if not self._detector_ready:
+            self.log_message("Advanced detector not available: missing " + ", ".join(missing_requirements()))
+            self.log_message("Click \"Install Dependencies\" or run: pip install -r requirements.txt")
         
     def create_widgets(self):
         # Main frame
@@ -127,39 +402,12 @@ class DrumBeatDetectorGUI:
         status_frame = ttk.Frame(main_frame)
         status_frame.grid(row=1, column=0, columnspan=2, pady=(0, 10))
         
-        # Show dependency status
-        deps_status = []
-        try:
-            import librosa
-            deps_status.append("✓ librosa")
-        except ImportError:
-            deps_status.append("✗ librosa")
-            
-        try:
-            import numpy
-            deps_status.append("✓ numpy")
-        except ImportError:
-            deps_status.append("✗ numpy")
-            
-        try:
-            import matplotlib
-            deps_status.append("✓ matplotlib")
-        except ImportError:
-            deps_status.append("✗ matplotlib")
-            
-        if MOVIEPY_AVAILABLE:
-            deps_status.append("✓ moviepy")
-        else:
-            deps_status.append("✗ moviepy")
+        # Show dependency status (text filled in by _refresh_dependency_status)
+        self.deps_label = ttk.Label(status_frame, font=("Arial", 9))
+        self.deps_label.pack()
         
-        status_text = " | ".join(deps_status)
-        status_label = ttk.Label(status_frame, text=f"Dependencies: {status_text}", font=("Arial", 9))
-        status_label.pack()
-        
-        if not MOVIEPY_AVAILABLE:
-            warning_label = ttk.Label(status_frame, text="⚠ Video processing disabled (moviepy not available)", 
-                                    foreground="orange", font=("Arial", 9))
-            warning_label.pack()
+        self.ffmpeg_warning = ttk.Label(status_frame, text="⚠ Video processing disabled (ffmpeg not found)", 
+                                        foreground="orange", font=("Arial", 9))
         
         # File selection area
         file_frame = ttk.LabelFrame(main_frame, text="File Selection", padding="10")
@@ -197,6 +445,10 @@ class DrumBeatDetectorGUI:
                                        command=self.start_processing, style="Accent.TButton")
         self.process_button.pack(side=tk.LEFT, padx=(0, 10))
         
+        self.install_button = ttk.Button(button_frame, text="Install Dependencies",
+                                         command=self.install_dependencies)
+        self.install_button.pack(side=tk.LEFT, padx=(0, 10))
+        
         ttk.Button(button_frame, text="Exit", command=self.root.quit).pack(side=tk.LEFT)
         
         # Progress bar frame
@@ -219,12 +471,16 @@ class DrumBeatDetectorGUI:
         log_frame = ttk.LabelFrame(main_frame, text="Processing Log", padding="5")
         log_frame.grid(row=7, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
         
-        self.log_text = tk.Text(log_frame, height=8, width=70)
+        # Append-only log: no undo stack, no re-wrapping on insert
+        self.log_text = tk.Text(log_frame, height=8, width=70, wrap='none', undo=False,
+                                autoseparators=False, maxundo=0)
         scrollbar = ttk.Scrollbar(log_frame, orient=tk.VERTICAL, command=self.log_text.yview)
-        self.log_text.configure(yscrollcommand=scrollbar.set)
+        x_scrollbar = ttk.Scrollbar(log_frame, orient=tk.HORIZONTAL, command=self.log_text.xview)
+        self.log_text.configure(yscrollcommand=scrollbar.set, xscrollcommand=x_scrollbar.set)
         
         self.log_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        x_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
         
         # Configure grid weights
         main_frame.columnconfigure(0, weight=1)
@@ -244,9 +500,7 @@ class DrumBeatDetectorGUI:
             filename = filedialog.askopenfilename(
                 title="Select Audio File",
                 filetypes=[
-                    ("Audio Files", "*.mp3 *.wav *.flac *.m4a *.ogg"),
-                    ("MP3 Files", "*.mp3"),
-                    ("WAV Files", "*.wav"),
+                    ("Audio Files", " ".join(f"*{ext}" for ext in sorted(AUDIO_EXTENSIONS))),
                     ("All Files", "*.*")
                 ]
             )
@@ -254,19 +508,22 @@ class DrumBeatDetectorGUI:
             filename = filedialog.askopenfilename(
                 title="Select Video File",
                 filetypes=[
-                    ("Video Files", "*.mp4 *.avi *.mkv *.mov *.wmv *.flv"),
-                    ("MP4 Files", "*.mp4"),
-                    ("AVI Files", "*.avi"),
+                    ("Video Files", " ".join(f"*{ext}" for ext in sorted(VIDEO_EXTENSIONS))),
                     ("All Files", "*.*")
                 ]
             )
             
         if filename:
+            path = pathlib.Path(filename)
+            # The extension decides how the file is processed, whichever filter it was picked under
+            suffix = path.suffix.lower()
+            if suffix in VIDEO_EXTENSIONS:
+                self.file_type.set("video")
+            elif suffix in AUDIO_EXTENSIONS:
+                self.file_type.set("audio")
             self.input_file.set(filename)
             # Auto set output file name
-            base_name = os.path.splitext(os.path.basename(filename))[0]
-            output_name = f"{base_name}.funscript"
-            self.output_file.set(output_name)
+            self.output_file.set(f"{path.stem}.funscript")
             
     def browse_output(self):
         """Browse output file"""
@@ -280,17 +537,41 @@ class DrumBeatDetectorGUI:
             
     def log_message(self, message):
         """Add log message"""
-        self.log_text.insert(tk.END, f"{message}\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        self._log_q.put(message)
         
     def update_progress(self, value, status_text=""):
         """Update progress bar"""
-        self.progress['value'] = value
-        self.progress_label.config(text=f"{int(value)}%")
+        self._pending_progress = value
         if status_text:
-            self.status_label.config(text=status_text)
-        self.root.update_idletasks()
+            self._pending_status = status_text
+        
+    def _flush_ui(self):
+        """Apply all pending log lines and progress updates to the widgets"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._log_q.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.log_text.insert(tk.END, "\n".join(batch) + "\n")
+            # Bound the widget's text so repaints don't grow with the run's history
+            line_count = int(self.log_text.index('end-1c').split('.')[0])
+            if line_count > LOG_MAX_LINES:
+                self.log_text.delete('1.0', f'{line_count - LOG_MAX_LINES}.0')
+            self.log_text.see(tk.END)
+        if self._pending_progress is not None:
+            value, self._pending_progress = self._pending_progress, None
+            self.progress.configure(value=value)
+            self.progress_label.configure(text=f"{int(value)}%")
+        if self._pending_status is not None:
+            status_text, self._pending_status = self._pending_status, None
+            self.status_label.configure(text=status_text)
+        
+    def _drain_ui(self):
+        """Periodic main-loop callback: one batched widget update per tick"""
+        self._flush_ui()
+        self.root.after(UI_POLL_MS, self._drain_ui)
         
     def start_processing(self):
         """Start processing"""
@@ -313,134 +594,160 @@ class DrumBeatDetectorGUI:
         # Start processing
         self.processing = True
         self.process_button.config(state='disabled')
+        self.install_button.config(state='disabled')
         self.progress['value'] = 0
         self.progress_label.config(text="0%")
         self.status_label.config(text="Processing...")
         self.log_text.delete(1.0, tk.END)
         
-        # Process in a new thread
-        thread = threading.Thread(target=self.process_audio)
-        thread.daemon = True
-        thread.start()
-        
-    def process_audio(self):
-        """Process audio file"""
-        try:
-            input_file = self.input_file.get()
-            
-            # If video file, extract audio first
-            if self.file_type.get() == "video":
-                self.log_message("Video file detected, extracting audio...")
-                self.update_progress(5, "Starting video processing...")
-                audio_file = self.extract_audio_from_video(input_file)
-                if not audio_file:
-                    raise Exception("Audio extraction failed")
-                self.update_progress(30, "Audio extraction completed")
-            else:
-                audio_file = input_file
-                self.log_message("Loading audio file...")
-                self.update_progress(10, "Loading audio file...")
-            
-            # Create detector
-            detector = AdvancedDrumBeatDetector(audio_file)
-            
-            # Load audio
-            detector.load_audio()
-            self.log_message("Audio loading completed")
-            self.update_progress(40, "Audio loading completed")
-            
-            # Detect beats
-            self.log_message("Detecting beats...")
-            self.update_progress(50, "Detecting beats...")
-            detector.detect_beats_librosa()
-            self.log_message("Beat detection completed")
-            self.update_progress(70, "Beat detection completed")
-            
-            # Export funscript
-            self.log_message("Exporting funscript...")
-            self.update_progress(80, "Exporting funscript...")
-            detector.export_funscript(self.output_file.get())
-            self.log_message("Funscript export completed")
-            self.update_progress(90, "Funscript export completed")
-            
-            self.log_message("Processing completed!")
-            self.update_progress(100, "Processing completed!")
-            messagebox.showinfo("Complete", "Funscript file generated successfully!")
-            
-        except Exception as e:
-            error_msg = f"Error during processing: {str(e)}"
-            self.log_message(error_msg)
-            messagebox.showerror("Error", error_msg)
-            
-        finally:
-            # Clean up temp files
-            if self.temp_audio_file and os.path.exists(self.temp_audio_file):
-                try:
-                    os.remove(self.temp_audio_file)
-                    self.log_message("Temporary file cleaned up")
-                except:
-                    pass
-            # Restore UI state
-            self.root.after(0, self.finish_processing)
-            
-    def extract_audio_from_video(self, video_path):
-        """Extract audio from video"""
+        self._start_worker()
+        self._jobs.put((self.input_file.get(), self.output_file.get(), self.file_type.get(), FFMPEG_PATH))
+        self.root.after(UI_POLL_MS, self._poll_worker)
+        
+    def _refresh_dependency_status(self):
+        """Show the current dependency probe and enable the actions it allows"""
+        status_text = " | ".join(f"{'✓' if available else '✗'} {name}"
+                                 for name, available in self.deps_status.items())
+        self.deps_label.config(text=f"Dependencies: {status_text}")
+        if FFMPEG_PATH:
+            self.ffmpeg_warning.pack_forget()
+        else:
+            self.ffmpeg_warning.pack()
+        
+        ready = self.deps_status["librosa"] and self.deps_status["numpy"]
+        if ready and not self._detector_ready:
+            # A worker started before the install could not import the detector
+            self.stop_worker()
+            # Spawn the detection process, which warms up librosa/numba on start, once the
+            # window has painted and while the user is still picking files. Starting it
+            # is a no-op if a click on Start Detection got there first.
+            self.root.after(WARMUP_DELAY_MS, self._start_worker)
+        self._detector_ready = ready
+        self.process_button.config(state='normal' if ready and not self.processing else 'disabled')
+        self.install_button.config(state='normal' if missing_requirements() else 'disabled')
+        
+    def install_dependencies(self):
+        """Install missing dependencies with pip, streaming its output into the log"""
+        missing = missing_requirements()
+        if self.processing or self._installer is not None or not missing:
+            return
+        self.install_button.config(state='disabled')
+        self.process_button.config(state='disabled')
+        self.log_message(f"Installing {', '.join(missing)}...")
         try:
-            # Check if moviepy is available
-            if not MOVIEPY_AVAILABLE:
-                raise Exception("MoviePy library not found. Please install it with: pip install moviepy")
-            
-            self.log_message("Loading video file...")
-            self.update_progress(15, "Loading video file...")
-            
-            # Create temp audio file
-            temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            temp_audio.close()
-            self.temp_audio_file = temp_audio.name
-            
-            # Extract audio
-            from moviepy import VideoFileClip
-            video = VideoFileClip(video_path)
-            audio = video.audio
-            
-            if audio is None:
-                video.close()
-                raise Exception("Video file has no audio track")
-            
-            self.log_message("Extracting audio from video...")
-            self.update_progress(20, "Extracting audio from video...")
-                
-            # Save audio to temp file
-            audio.write_audiofile(self.temp_audio_file)
-            
-            # Close video file
-            video.close()
-            
-            self.log_message("Audio extraction completed successfully")
-            return self.temp_audio_file
-            
-        except Exception as e:
-            # Clean up temp files
-            if hasattr(self, 'temp_audio_file') and self.temp_audio_file and os.path.exists(self.temp_audio_file):
-                try:
-                    os.remove(self.temp_audio_file)
-                except:
-                    pass
-            raise Exception(f"Audio extraction failed: {str(e)}")
+            self._installer = _install_missing(missing)
+        except OSError as e:
+            self.log_message(f"Failed to install dependencies: {e}")
+            self._refresh_dependency_status()
+            return
+        # pip's pipe is read on a thread; the lines reach the widget through the log queue
+        self._installer_output = threading.Thread(target=self._pump_installer_output,
+                                                  args=(self._installer.stdout,), daemon=True)
+        self._installer_output.start()
+        self.root.after(UI_POLL_MS, self._poll_installer)
+        
+    def _pump_installer_output(self, stdout):
+        for line in stdout:
+            line = line.rstrip()
+            if line:
+                self.log_message(line)
+        
+    def _poll_installer(self):
+        """Wait for pip without blocking the Tk loop, then re-probe the dependencies"""
+        if self._installer.poll() is None:
+            self.root.after(UI_POLL_MS, self._poll_installer)
+            return
+        self._installer_output.join()
+        returncode = self._installer.returncode
+        self._installer = None
+        if returncode == 0:
+            self.log_message("Dependencies installed successfully")
+        else:
+            self.log_message(f"Failed to install dependencies (pip exit code {returncode})")
+        # Make freshly installed packages visible to find_spec
+        importlib.invalidate_caches()
+        check_dependencies()
+        self._refresh_dependency_status()
+        
+    def _start_worker(self):
+        """Spawn the detection process unless it is already running"""
+        # Detection runs in a separate process: the Tk loop never competes with
+        # librosa/numba for the GIL, and their import/JIT cost stays out of the GUI
+        if self._worker is not None and self._worker.is_alive():
+            return
+        ctx = multiprocessing.get_context("spawn")
+        self._jobs = ctx.Queue()
+        self._events = ctx.Queue()
+        self._worker = ctx.Process(target=_worker_main, args=(self._jobs, self._events), daemon=True)
+        self._worker.start()
+        
+    def stop_worker(self):
+        """Ask the detection process to exit and wait briefly for it"""
+        if self._worker is not None and self._worker.is_alive():
+            self._jobs.put(None)
+            self._worker.join(timeout=2)
+        self._worker = None
+        
+    def _poll_worker(self):
+        """Forward worker events to the UI until the worker reports completion"""
+        worker_alive = self._worker.is_alive()
+        done = None
+        while done is None:
+            try:
+                # Once the worker is gone, wait briefly for events still in the pipe
+                event = self._events.get(timeout=0.5) if not worker_alive else self._events.get_nowait()
+            except queue.Empty:
+                break
+            kind = event[0]
+            if kind == "log":
+                self.log_message(event[1])
+            elif kind == "progress":
+                self.update_progress(event[1], event[2])
+            elif kind == "done":
+                done = event
+        
+        if done is None and worker_alive:
+            self.root.after(UI_POLL_MS, self._poll_worker)
+            return
+        
+        if done is None:
+            self._worker.join()
+            done = ("done", False, f"Error during processing: worker exited unexpectedly "
+                                   f"(exit code {self._worker.exitcode})")
+            # The next run spawns a fresh worker
+            self._worker = None
+        _, success, message = done
+        if success:
+            self._flush_ui()
+            messagebox.showinfo("Complete", message)
+        else:
+            self.log_message(message)
+            self._flush_ui()
+            messagebox.showerror("Error", message)
+        self.finish_processing()
             
     def finish_processing(self):
         """Finish processing, restore UI state"""
+        # Apply anything still queued, so it can't land after the reset
+        self._flush_ui()
         self.processing = False
         self.process_button.config(state='normal')
+        self.install_button.config(state='normal' if missing_requirements() else 'disabled')
         self.progress['value'] = 0
         self.progress_label.config(text="0%")
         self.status_label.config(text="Ready")
 
 def main():
     """Main function"""
+    # Probe dependencies at startup (not at import time: spawned workers re-import this module).
+    # Nothing is installed here; the GUI offers that as a button.
+    deps_status = check_dependencies()
+    
     root = tk.Tk()
-    app = DrumBeatDetectorGUI(root)
+    app = DrumBeatDetectorGUI(root, deps_status)
     root.mainloop()
+    app.stop_worker()
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""Tests for the fast (amplitude envelope) detection mode"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from advanced_detector import AdvancedDrumBeatDetector, DEFAULT_SR
+
+N_HITS = 40
+PERIOD = 0.5
+FIRST_HIT = 0.25
+
+
+def click_track(noise, pad, sr=DEFAULT_SR, seed=0):
+    """Decaying noise bursts every PERIOD seconds over background noise and a sustained tone"""
+    rng = np.random.default_rng(seed)
+    n = int(sr * (N_HITS * PERIOD + 1))
+    t = np.arange(n) / sr
+    y = noise * rng.standard_normal(n) + pad * np.sin(2 * np.pi * 110 * t)
+    burst = np.arange(int(0.08 * sr)) / sr
+    for k in range(N_HITS):
+        start = int((FIRST_HIT + k * PERIOD) * sr)
+        y[start:start + len(burst)] += rng.uniform(0.4, 1.0) * rng.standard_normal(len(burst)) * np.exp(-60 * burst)
+    return y.astype(np.float32)
+
+
+def detect_fast(y, sr=DEFAULT_SR):
+    detector = AdvancedDrumBeatDetector("", use_cache=False)
+    detector.y = y
+    detector.sr = sr
+    detector.detect_beats_fast()
+    return detector
+
+
+@pytest.mark.parametrize("noise, pad", [(0.0, 0.0), (0.02, 0.1), (0.05, 0.3), (0.2, 0.0)])
+def test_fast_mode_finds_each_click_once(noise, pad):
+    detector = detect_fast(click_track(noise, pad))
+    assert len(detector.onset_times) == N_HITS
+
+
+def test_fast_mode_places_hits_on_the_clicks():
+    detector = detect_fast(click_track(0.05, 0.3))
+    expected = FIRST_HIT + PERIOD * np.arange(N_HITS)
+    assert np.abs(detector.onset_times - expected).max() < 0.005
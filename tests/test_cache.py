@@ -0,0 +1,73 @@
+"""Tests for the on-disk analysis cache"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import advanced_detector
+from advanced_detector import AdvancedDrumBeatDetector, DEFAULT_SR
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "cache"
+    monkeypatch.setattr(advanced_detector, "CACHE_DIR", str(directory))
+    return directory
+
+
+@pytest.fixture
+def audio_file(tmp_path):
+    """Eight seconds of decaying 80 Hz thumps at 120 BPM"""
+    t = np.arange(int(0.2 * DEFAULT_SR)) / DEFAULT_SR
+    thump = np.sin(2 * np.pi * 80 * t) * np.exp(-25 * t)
+    y = np.zeros(8 * DEFAULT_SR)
+    for start in range(0, len(y) - len(thump), DEFAULT_SR // 2):
+        y[start:start + len(thump)] += thump
+    path = tmp_path / "beats.wav"
+    sf.write(str(path), y.astype(np.float32), DEFAULT_SR)
+    return str(path)
+
+
+def analyze(path):
+    detector = AdvancedDrumBeatDetector(path)
+    detector.load_audio()
+    detector.detect_beats_librosa()
+    return detector
+
+
+def cache_entries(cache_dir):
+    return sorted(cache_dir.glob("*.npz"))
+
+
+def test_cache_round_trip(cache_dir, audio_file):
+    first = analyze(audio_file)
+    assert len(cache_entries(cache_dir)) == 1
+
+    second = AdvancedDrumBeatDetector(audio_file)
+    second.load_audio()
+    np.testing.assert_array_equal(second.y, first.y)
+    np.testing.assert_array_equal(second.onset_frames, first.onset_frames)
+    np.testing.assert_array_equal(second.onset_env, first.onset_env)
+
+
+def test_corrupt_entry_is_discarded_and_replaced(cache_dir, audio_file):
+    expected = analyze(audio_file).onset_frames
+    (entry,) = cache_entries(cache_dir)
+    data = entry.read_bytes()
+    entry.write_bytes(data[:len(data) // 2])
+
+    detector = AdvancedDrumBeatDetector(audio_file)
+    detector.load_audio()
+    assert detector.onset_frames is None
+    assert not entry.exists()
+
+    detector.detect_beats_librosa()
+    np.testing.assert_array_equal(detector.onset_frames, expected)
+    restored = AdvancedDrumBeatDetector(audio_file)
+    restored.load_audio()
+    np.testing.assert_array_equal(restored.onset_frames, expected)